@@ -1,124 +1,352 @@
-from flask import Flask, request, jsonify
-import sqlite3, hashlib
-from datetime import datetime
+from flask import Flask, Response, abort, request
+from functools import lru_cache, wraps
+import sqlite3, hashlib, hmac, os, re, threading, time
+import fastjsonschema, orjson
 
 app = Flask(__name__)
 DATABASE = 'app.db'
 
-# Utility: Get a connection to the database.
-def get_db_connection():
+# Column order of the tasks table, used to build task dicts from plain row tuples.
+TASK_COLS = ('id', 'user_id', 'title', 'description', 'start_date', 'due_date', 'completion_date', 'status')
+
+# Rows encoded per chunk when streaming a task list.
+STREAM_BATCH_SIZE = 500
+
+# Shape of an ISO 8601 date or date-time, e.g. 2025-04-10, 2025-04-10T09 or 2025-04-10 09:30:00+02:00.
+# Covers the forms datetime.fromisoformat accepted before, with a T or space separator.
+# Dates in this shape sort correctly as plain strings, so they are compared without parsing.
+# A space sorts before T, so batch_delete_tasks swaps a space separator for T before checking
+# that start_date <= end_date; the query itself uses the strings as given.
+ISO_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}(?:[T ]\d{2}(?::\d{2}(?::\d{2}(?:\.\d+)?)?)?(?:Z|[+-]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?)?')
+
+# Request body validators, compiled once at import into plain Python functions.
+_REQUIRED_STRING = {'type': 'string', 'minLength': 1}
+_OPTIONAL_STRING = {'type': ['string', 'null']}
+_TASK_FIELDS = ('title', 'description', 'start_date', 'due_date', 'completion_date', 'status')
+
+CREDENTIALS_V = fastjsonschema.compile({
+    'type': 'object',
+    'required': ['username', 'email', 'password'],
+    'properties': {'username': _REQUIRED_STRING, 'email': _REQUIRED_STRING, 'password': _REQUIRED_STRING},
+})
+CREATE_TASK_V = fastjsonschema.compile({
+    'type': 'object',
+    'required': ['title'],
+    'properties': {
+        'title': _REQUIRED_STRING,
+        'description': {**_OPTIONAL_STRING, 'default': ''},
+        'start_date': _OPTIONAL_STRING,
+        'due_date': _OPTIONAL_STRING,
+        'completion_date': _OPTIONAL_STRING,
+        'status': {**_OPTIONAL_STRING, 'default': 'pending'},
+    },
+})
+# At least one field must be given with a non-empty value. allOf runs the type check first,
+# so a wrongly typed field is reported as such rather than as missing update data.
+UPDATE_TASK_V = fastjsonschema.compile({
+    'type': 'object',
+    'allOf': [
+        {'properties': {field: _OPTIONAL_STRING for field in _TASK_FIELDS}},
+        {'anyOf': [{'required': [field], 'properties': {field: _REQUIRED_STRING}} for field in _TASK_FIELDS]},
+    ],
+})
+BATCH_DELETE_V = fastjsonschema.compile({
+    'type': 'object',
+    'required': ['start_date', 'end_date'],
+    'properties': {'start_date': _REQUIRED_STRING, 'end_date': _REQUIRED_STRING},
+})
+SUBSCRIBE_V = fastjsonschema.compile({
+    'type': 'object',
+    'required': ['user_id', 'frequency'],
+    'properties': {'user_id': {'type': 'integer', 'minimum': 1}, 'frequency': {'enum': ['daily', 'weekly', 'monthly']}},
+})
+UNSUBSCRIBE_V = fastjsonschema.compile({
+    'type': 'object',
+    'required': ['user_id'],
+    'properties': {'user_id': {'type': 'integer', 'minimum': 1}},
+})
+
+# Canonical SQL for the routes. sqlite3 caches prepared statements per connection keyed by
+# the SQL text, so reusing the same strings skips re-parsing on every request.
+SQL_USER_EXISTS = "SELECT id FROM users WHERE id = ?"
+SQL_INSERT_USER = "INSERT INTO users (username, email, password) VALUES (?, ?, ?)"
+SQL_GET_LOGIN_USER = "SELECT id, password FROM users WHERE username = ? AND email = ?"
+SQL_UPDATE_PASSWORD = "UPDATE users SET password = ? WHERE id = ?"
+SQL_INSERT_TASK = "INSERT INTO tasks (user_id, title, description, start_date, due_date, completion_date, status) VALUES (?, ?, ?, ?, ?, ?, ?)"
+SQL_GET_TASK = "SELECT id, user_id, title, description, start_date, due_date, completion_date, status FROM tasks WHERE id = ? AND deleted_at IS NULL"
+# Each row comes back as a ready-made JSON object text, built by SQLite's json_object() in C.
+SQL_FETCH_TASKS_JSON = "SELECT json_object('id', id, 'user_id', user_id, 'title', title, 'description', description, 'start_date', start_date, 'due_date', due_date, 'completion_date', completion_date, 'status', status) FROM tasks WHERE user_id = ? AND deleted_at IS NULL"
+SQL_UPDATE_TASK = "UPDATE tasks SET title = COALESCE(?, title), description = COALESCE(?, description), start_date = COALESCE(?, start_date), due_date = COALESCE(?, due_date), completion_date = COALESCE(?, completion_date), status = COALESCE(?, status) WHERE id = ? AND user_id = ? AND deleted_at IS NULL"
+SQL_DELETE_TASK = "UPDATE tasks SET deleted_at = ? WHERE id = ? AND user_id = ? AND deleted_at IS NULL"
+SQL_TASK_EXISTS = "SELECT 1 FROM tasks WHERE id = ? AND deleted_at IS NULL"
+SQL_BATCH_DELETE_TASKS = "UPDATE tasks SET deleted_at = ? WHERE user_id = ? AND due_date BETWEEN ? AND ? AND deleted_at IS NULL"
+SQL_RESTORE_LAST_TASK = "UPDATE tasks SET deleted_at = NULL WHERE id = (SELECT id FROM tasks WHERE user_id = ? AND deleted_at IS NOT NULL ORDER BY deleted_at DESC LIMIT 1) RETURNING id"
+SQL_INSERT_SUBSCRIPTION = "INSERT INTO subscriptions (user_id, frequency) VALUES (?, ?)"
+SQL_DELETE_SUBSCRIPTIONS = "DELETE FROM subscriptions WHERE user_id = ?"
+
+# Pragmas applied once when a connection is opened.
+# WAL lets readers run alongside a writer and turns each commit into an append.
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA busy_timeout=5000",
+)
+
+# One connection per worker thread, reused across requests.
+_local = threading.local()
+
+# Utility: Open a new connection to the database.
+def connect_db():
     conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row  # Enable name-based access to columns.
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+# Utility: Get this thread's connection to the database, opening it on first use.
+def get_db_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _local.conn = connect_db()
     return conn
 
-# Utility: Hash passwords using SHA-256.
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+# Roll back anything a request left uncommitted so the write lock is never held between requests.
+@app.teardown_appcontext
+def rollback_open_transaction(exception):
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+# Utility: Build a JSON response, encoded with orjson.
+def json_response(obj, status=200):
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
+
+# Error responses, built once at import. They are never modified, so every request can return the same object.
+ERR_NOT_JSON_OBJECT = json_response({'error': 'Request body must be a JSON object'}, 400)
+ERR_NO_AUTH = json_response({'error': 'Authentication required via X-User-Id header'}, 401)
+ERR_INVALID_AUTH = json_response({'error': 'Invalid X-User-Id header'}, 400)
+ERR_NO_SUCH_USER = json_response({'error': 'User does not exist'}, 401)
+ERR_CREDENTIALS_REQUIRED = json_response({'error': 'Username, email, and password are required'}, 400)
+ERR_USER_EXISTS = json_response({'error': 'User already exists or email is already in use'}, 409)
+ERR_INVALID_CREDENTIALS = json_response({'error': 'Invalid credentials'}, 401)
+ERR_TITLE_REQUIRED = json_response({'error': 'Title is required'}, 400)
+ERR_INVALID_STATUS_FILTER = json_response({'error': 'Invalid status filter'}, 400)
+ERR_TASK_NOT_FOUND = json_response({'error': 'Task not found'}, 404)
+ERR_FORBIDDEN_VIEW = json_response({'error': 'Unauthorized: You do not have permission to view this task'}, 403)
+ERR_FORBIDDEN_UPDATE = json_response({'error': 'Unauthorized: You do not have permission to update this task'}, 403)
+ERR_FORBIDDEN_DELETE = json_response({'error': 'Unauthorized: You do not have permission to delete this task'}, 403)
+ERR_NO_UPDATE_DATA = json_response({'error': 'No update data provided'}, 400)
+ERR_DATES_REQUIRED = json_response({'error': 'Both start_date and end_date are required'}, 400)
+ERR_INVALID_DATE = json_response({'error': 'Invalid date format. Use ISO 8601 format: YYYY-MM-DDTHH:MM:SS'}, 400)
+ERR_DATE_ORDER = json_response({'error': 'start_date must be before end_date'}, 400)
+ERR_NOTHING_TO_RESTORE = json_response({'error': 'No deleted tasks found to restore'}, 404)
+ERR_INVALID_SUBSCRIPTION = json_response({'error': 'Invalid subscription data; user_id and frequency (daily, weekly, monthly) required'}, 400)
+ERR_USER_ID_REQUIRED = json_response({'error': 'user_id is required'}, 400)
+
+# Utility: Parse the JSON request body with orjson. Anything but a JSON object is rejected with a 400.
+def get_json_body():
+    try:
+        data = orjson.loads(request.get_data())
+    except orjson.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        abort(ERR_NOT_JSON_OBJECT)
+    return data
+
+# Schema rules whose failure means a required field is missing or empty.
+_MISSING_FIELD_RULES = frozenset(('required', 'minLength', 'anyOf'))
+# The subscription routes answer every invalid body with their own message.
+_SUBSCRIPTION_RULES = _MISSING_FIELD_RULES | {'type', 'enum', 'minimum'}
+
+# Utility: Parse the JSON body and check it with a compiled validator. Returns None if a rule in
+# route_rules fails (by default: a required field is missing or empty), so the route can answer
+# with its own message; any other mismatch is rejected here with a 400 naming the offending field.
+def get_validated_body(validate, route_rules=_MISSING_FIELD_RULES):
+    try:
+        return validate(get_json_body())
+    except fastjsonschema.JsonSchemaException as e:
+        if e.rule in route_rules:
+            return None
+        abort(json_response({'error': e.message.removeprefix('data.')}, 400))
+
+# scrypt parameters for password hashing (~16 MiB of memory per hash).
+SCRYPT_PREFIX = 'scrypt$'
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2**14, 8, 1
+SALT_SIZE = 16
+KEY_SIZE = 32
+
+# Utility: Hash passwords using scrypt. Stored as 'scrypt$' + hex(salt || hash).
+def hash_password(password, salt=None):
+    if salt is None:
+        salt = os.urandom(SALT_SIZE)
+    key = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=KEY_SIZE)
+    return SCRYPT_PREFIX + (salt + key).hex()
+
+# Utility: Check a password against a stored hash.
+# Hashes without the scrypt prefix are legacy unsalted SHA-256 hex digests.
+def verify_password(password, stored):
+    if stored.startswith(SCRYPT_PREFIX):
+        salt = bytes.fromhex(stored[len(SCRYPT_PREFIX):])[:SALT_SIZE]
+        candidate = hash_password(password, salt)
+    else:
+        candidate = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(candidate, stored)
+
+# Helper: Look up a user id, caching hits. Users are never deleted, so a hit stays valid.
+# A miss raises instead of returning False because lru_cache does not cache exceptions,
+# which keeps a user who signs up later (possibly in another worker) from being seen as missing.
+@lru_cache(maxsize=4096)
+def _user_exists_cached(user_id):
+    conn = get_db_connection()
+    if conn.execute(SQL_USER_EXISTS, (user_id,)).fetchone() is None:
+        raise LookupError(user_id)
+    return True
 
 # Helper: Check if a user exists by user_id.
 def user_exists(user_id):
-    with get_db_connection() as conn:
-        user = conn.execute("SELECT id FROM users WHERE id = ?", (user_id,)).fetchone()
-    return user is not None
+    try:
+        return _user_exists_cached(user_id)
+    except LookupError:
+        return False
+
+# Decorator: Authenticate the request via the "X-User-Id" header and pass the user id to the route.
+def require_user(route):
+    @wraps(route)
+    def wrapper(*args, **kwargs):
+        auth_user_id = request.headers.get('X-User-Id')
+        if not auth_user_id:
+            return ERR_NO_AUTH
+        try:
+            auth_user_id = int(auth_user_id)
+        except ValueError:
+            return ERR_INVALID_AUTH
+        if not user_exists(auth_user_id):
+            return ERR_NO_SUCH_USER
+        return route(auth_user_id, *args, **kwargs)
+    return wrapper
+
+# Helper: Answer a write on a task that matched no rows, i.e. the task is missing (404)
+# or belongs to another user (403). The ownership check is part of the write itself.
+def task_write_denied(conn, task_id, forbidden):
+    conn.rollback()
+    if conn.execute(SQL_TASK_EXISTS, (task_id,)).fetchone() is None:
+        return ERR_TASK_NOT_FOUND
+    return forbidden
 
 # Initialize the database and create tables if they do not exist.
+# Uses its own short-lived connection so a process that only runs init_db
+# (e.g. the gunicorn master before forking) does not keep one open.
 def init_db():
-    with get_db_connection() as conn:
-        # Users table with username, email, and password.
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL
-            )
-        ''')
-        # Tasks table with the required fields.
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                description TEXT,
-                start_date TEXT,
-                due_date TEXT,
-                completion_date TEXT,
-                status TEXT DEFAULT 'pending',
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')
-        # Subscriptions table for report subscriptions.
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS subscriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                frequency TEXT CHECK(frequency IN ('daily', 'weekly', 'monthly')) NOT NULL,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')
-        # Deleted tasks table to support restore functionality.
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS deleted_tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                description TEXT,
-                start_date TEXT,
-                due_date TEXT,
-                completion_date TEXT,
-                status TEXT,
-                deletion_time TEXT,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
+    conn = connect_db()
+    # Users table with username, email, and password.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )
+    ''')
+    # Tasks table with the required fields.
+    # Tasks are soft-deleted: deleted_at is the deletion time in nanoseconds since the epoch, NULL while live.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            start_date TEXT,
+            due_date TEXT,
+            completion_date TEXT,
+            status TEXT DEFAULT 'pending',
+            deleted_at INTEGER,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+    # Subscriptions table for report subscriptions.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            frequency TEXT CHECK(frequency IN ('daily', 'weekly', 'monthly')) NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+    # Databases from before soft deletes: add deleted_at, move the rows of the old
+    # deleted_tasks table back into tasks as deleted, and drop it. The deletion time is
+    # taken from deletion_time_ns where that column exists, else from the local-time ISO
+    # string; rows with neither get 0 so they can never come back as live tasks.
+    conn.execute("BEGIN IMMEDIATE")
+    task_columns = {row['name'] for row in conn.execute("PRAGMA table_info(tasks)")}
+    if 'deleted_at' not in task_columns:
+        conn.execute("ALTER TABLE tasks ADD COLUMN deleted_at INTEGER")
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'deleted_tasks'").fetchone():
+        deleted_at = "CAST((julianday(deletion_time, 'utc') - 2440587.5) * 86400000 AS INTEGER) * 1000000"
+        if 'deletion_time_ns' in {row['name'] for row in conn.execute("PRAGMA table_info(deleted_tasks)")}:
+            deleted_at = f"deletion_time_ns, {deleted_at}"
+        conn.execute(f'''
+            INSERT INTO tasks (user_id, title, description, start_date, due_date, completion_date, status, deleted_at)
+            SELECT user_id, title, description, start_date, due_date, completion_date, status,
+                   COALESCE({deleted_at}, 0)
+            FROM deleted_tasks
         ''')
-        conn.commit()
+        conn.execute("DROP TABLE deleted_tasks")
+    # Partial indexes: live tasks for the per-user lookups, deleted ones for the restore-last query.
+    conn.execute("DROP INDEX IF EXISTS idx_tasks_user_due")
+    conn.execute("DROP INDEX IF EXISTS idx_tasks_user_status")
+    conn.execute("DROP INDEX IF EXISTS idx_tasks_user_status_due")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_live ON tasks(user_id, due_date) WHERE deleted_at IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_live_status ON tasks(user_id, status, due_date) WHERE deleted_at IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_trash ON tasks(user_id, deleted_at DESC) WHERE deleted_at IS NOT NULL")
+    conn.commit()
+    conn.close()
     print("Database initialized.")
 
-# Initialize the DB on startup.
-init_db()
+# CLI: "flask init-db" creates the schema without starting the server.
+@app.cli.command('init-db')
+def init_db_command():
+    init_db()
 
 # ---------------------------
 # User Authentication Routes
 # ---------------------------
 @app.route('/signup', methods=['POST'])
 def signup():
-    data = request.get_json()
-    username = data.get('username')
-    email = data.get('email')
-    password = data.get('password')
-    
-    if not username or not email or not password:
-        return jsonify({'error': 'Username, email, and password are required'}), 400
+    data = get_validated_body(CREDENTIALS_V)
+    if data is None:
+        return ERR_CREDENTIALS_REQUIRED
+    username, email, password = data['username'], data['email'], data['password']
 
     hashed = hash_password(password)
     try:
-        with get_db_connection() as conn:
-            conn.execute("INSERT INTO users (username, email, password) VALUES (?, ?, ?)", 
-                         (username, email, hashed))
-            conn.commit()
-        return jsonify({'message': 'User created'}), 201
+        conn = get_db_connection()
+        conn.execute(SQL_INSERT_USER, (username, email, hashed))
+        conn.commit()
+        return json_response({'message': 'User created'}, 201)
     except sqlite3.IntegrityError:
-        return jsonify({'error': 'User already exists or email is already in use'}), 409
+        return ERR_USER_EXISTS
 
 @app.route('/login', methods=['POST'])
 def login():
-    data = request.get_json()
-    username = data.get('username')
-    email = data.get('email')
-    password = data.get('password')
-    
-    if not username or not email or not password:
-        return jsonify({'error': 'Username, email, and password are required'}), 400
-
-    hashed = hash_password(password)
-    with get_db_connection() as conn:
-        user = conn.execute("SELECT * FROM users WHERE username = ? AND email = ? AND password = ?",
-                            (username, email, hashed)).fetchone()
-
-    if user:
-        return jsonify({'message': 'Login successful', 'user_id': user['id']}), 200
+    data = get_validated_body(CREDENTIALS_V)
+    if data is None:
+        return ERR_CREDENTIALS_REQUIRED
+    username, email, password = data['username'], data['email'], data['password']
+
+    conn = get_db_connection()
+    user = conn.execute(SQL_GET_LOGIN_USER, (username, email)).fetchone()
+
+    if user and verify_password(password, user['password']):
+        # Upgrade a legacy SHA-256 hash to scrypt now that the password is known.
+        if not user['password'].startswith(SCRYPT_PREFIX):
+            conn.execute(SQL_UPDATE_PASSWORD, (hash_password(password), user['id']))
+            conn.commit()
+        return json_response({'message': 'Login successful', 'user_id': user['id']}, 200)
     else:
-        return jsonify({'error': 'Invalid credentials'}), 401
+        return ERR_INVALID_CREDENTIALS
 
 # ---------------------------
 # Task Management Routes (Authentication Required)
@@ -126,54 +354,27 @@ def login():
 # All task endpoints require the header "X-User-Id" for authentication.
 
 @app.route('/tasks', methods=['POST'])
-def create_task():
-    # Retrieve the authenticated user id from header.
-    auth_user_id = request.headers.get('X-User-Id')
-    if not auth_user_id:
-        return jsonify({'error': 'Authentication required via X-User-Id header'}), 401
-    try:
-        auth_user_id = int(auth_user_id)
-    except ValueError:
-        return jsonify({'error': 'Invalid X-User-Id header'}), 400
-    if not user_exists(auth_user_id):
-        return jsonify({'error': 'User does not exist'}), 401
-
-    data = request.get_json()
-    title = data.get('title')
-    description = data.get('description', '')
-    start_date = data.get('start_date') 
-    due_date = data.get('due_date')      
-    completion_date = data.get('completion_date')  
-    status = data.get('status', 'pending')
-    
-    if not title:
-        return jsonify({'error': 'Title is required'}), 400
-
-    with get_db_connection() as conn:
-        cur = conn.execute(
-            "INSERT INTO tasks (user_id, title, description, start_date, due_date, completion_date, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (auth_user_id, title, description, start_date, due_date, completion_date, status)
-        )
-        conn.commit()
-        task_id = cur.lastrowid
-    return jsonify({'message': 'Task created', 'task_id': task_id}), 201
+@require_user
+def create_task(auth_user_id):
+    data = get_validated_body(CREATE_TASK_V)
+    if data is None:
+        return ERR_TITLE_REQUIRED
+
+    conn = get_db_connection()
+    cur = conn.execute(SQL_INSERT_TASK, (auth_user_id, *[data.get(field) for field in _TASK_FIELDS]))
+    conn.commit()
+    task_id = cur.lastrowid
+    return json_response({'message': 'Task created', 'task_id': task_id}, 201)
 
 @app.route('/tasks', methods=['GET'])
-def fetch_tasks():
-    auth_user_id = request.headers.get('X-User-Id')
-    if not auth_user_id:
-        return jsonify({'error': 'Authentication required via X-User-Id header'}), 401
-    try:
-        auth_user_id = int(auth_user_id)
-    except ValueError:
-        return jsonify({'error': 'Invalid X-User-Id header'}), 400
-
+@require_user
+def fetch_tasks(auth_user_id):
     # Optional query parameters.
     status_filter = request.args.get('status')  
     date_from = request.args.get('date_from')    
     date_to = request.args.get('date_to')       
 
-    query = "SELECT * FROM tasks WHERE user_id = ?"
+    query = SQL_FETCH_TASKS_JSON
     params = [auth_user_id]
 
     if status_filter:
@@ -182,11 +383,12 @@ def fetch_tasks():
             query += " AND status = ?"
             params.append(status_filter)
         elif status_filter == 'overdue':
-            now = datetime.now().isoformat()
-            query += " AND due_date < ? AND status != 'completed'"
+            # Local time, formatted like the stored dates; cheaper than datetime.now().isoformat().
+            now = time.strftime('%Y-%m-%dT%H:%M:%S')
+            query += " AND status != 'completed' AND due_date < ?"
             params.append(now)
         else:
-            return jsonify({'error': 'Invalid status filter'}), 400
+            return ERR_INVALID_STATUS_FILTER
 
     if date_from:
         query += " AND due_date >= ?"
@@ -195,236 +397,131 @@ def fetch_tasks():
         query += " AND due_date <= ?"
         params.append(date_to)
 
-    with get_db_connection() as conn:
-        tasks = conn.execute(query, params).fetchall()
-
-    tasks_list = []
-    for task in tasks:
-        tasks_list.append({
-            'id': task['id'],
-            'user_id': task['user_id'],
-            'title': task['title'],
-            'description': task['description'],
-            'start_date': task['start_date'],
-            'due_date': task['due_date'],
-            'completion_date': task['completion_date'],
-            'status': task['status']
-        })
-    return jsonify({'tasks': tasks_list}), 200
+    # Rows are single JSON strings, so skip sqlite3.Row and just join them.
+    cur = get_db_connection().cursor()
+    cur.row_factory = None
+    cur.execute(query, params)
+
+    # Stream the list in batches so the full result set is never held in memory.
+    def generate():
+        yield b'{"tasks":['
+        separator = b''
+        while True:
+            tasks = cur.fetchmany(STREAM_BATCH_SIZE)
+            if not tasks:
+                break
+            yield separator + ','.join([task for task, in tasks]).encode()
+            separator = b','
+        yield b']}'
+
+    return Response(generate(), status=200, mimetype='application/json')
 
 @app.route('/tasks/<int:task_id>', methods=['GET'])
-def get_task(task_id):
-    auth_user_id = request.headers.get('X-User-Id')
-    if not auth_user_id:
-        return jsonify({'error': 'Authentication required via X-User-Id header'}), 401
-    try:
-        auth_user_id = int(auth_user_id)
-    except ValueError:
-        return jsonify({'error': 'Invalid X-User-Id header'}), 400
-
-    with get_db_connection() as conn:
-        task = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+@require_user
+def get_task(auth_user_id, task_id):
+    cur = get_db_connection().cursor()
+    cur.row_factory = None
+    task = cur.execute(SQL_GET_TASK, (task_id,)).fetchone()
     if not task:
-        return jsonify({'error': 'Task not found'}), 404
+        return ERR_TASK_NOT_FOUND
+    task = dict(zip(TASK_COLS, task))
     if task['user_id'] != auth_user_id:
-        return jsonify({'error': 'Unauthorized: You do not have permission to view this task'}), 403
-
-    return jsonify({
-        'id': task['id'],
-        'user_id': task['user_id'],
-        'title': task['title'],
-        'description': task['description'],
-        'start_date': task['start_date'],
-        'due_date': task['due_date'],
-        'completion_date': task['completion_date'],
-        'status': task['status']
-    }), 200
+        return ERR_FORBIDDEN_VIEW
 
-@app.route('/tasks/<int:task_id>', methods=['PUT'])
-def update_task(task_id):
-    auth_user_id = request.headers.get('X-User-Id')
-    if not auth_user_id:
-        return jsonify({'error': 'Authentication required via X-User-Id header'}), 401
-    try:
-        auth_user_id = int(auth_user_id)
-    except ValueError:
-        return jsonify({'error': 'Invalid X-User-Id header'}), 400
+    return json_response(task, 200)
 
-    with get_db_connection() as conn:
-        task = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
-    if not task:
-        return jsonify({'error': 'Task not found'}), 404
-    if task['user_id'] != auth_user_id:
-        return jsonify({'error': 'Unauthorized: You do not have permission to update this task'}), 403
-
-    data = request.get_json()
-    title = data.get('title')
-    description = data.get('description')
-    start_date = data.get('start_date')
-    due_date = data.get('due_date')
-    completion_date = data.get('completion_date')
-    status = data.get('status')
-    
-    if not any([title, description, start_date, due_date, completion_date, status]):
-        return jsonify({'error': 'No update data provided'}), 400
-
-    with get_db_connection() as conn:
-        conn.execute(
-            "UPDATE tasks SET title = COALESCE(?, title), description = COALESCE(?, description), start_date = COALESCE(?, start_date), due_date = COALESCE(?, due_date), completion_date = COALESCE(?, completion_date), status = COALESCE(?, status) WHERE id = ?",
-            (title, description, start_date, due_date, completion_date, status, task_id)
-        )
-        conn.commit()
-    return jsonify({'message': 'Task updated'}), 200
+@app.route('/tasks/<int:task_id>', methods=['PUT'])
+@require_user
+def update_task(auth_user_id, task_id):
+    data = get_validated_body(UPDATE_TASK_V)
+    if data is None:
+        return ERR_NO_UPDATE_DATA
+
+    conn = get_db_connection()
+    cur = conn.execute(SQL_UPDATE_TASK, (*[data.get(field) for field in _TASK_FIELDS], task_id, auth_user_id))
+    if cur.rowcount == 0:
+        return task_write_denied(conn, task_id, ERR_FORBIDDEN_UPDATE)
+    conn.commit()
+    return json_response({'message': 'Task updated'}, 200)
 
 @app.route('/tasks/<int:task_id>', methods=['DELETE'])
-def delete_task(task_id):
-    auth_user_id = request.headers.get('X-User-Id')
-    if not auth_user_id:
-        return jsonify({'error': 'Authentication required via X-User-Id header'}), 401
-    try:
-        auth_user_id = int(auth_user_id)
-    except ValueError:
-        return jsonify({'error': 'Invalid X-User-Id header'}), 400
-
-    with get_db_connection() as conn:
-        task = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
-    if not task:
-        return jsonify({'error': 'Task not found'}), 404
-    if task['user_id'] != auth_user_id:
-        return jsonify({'error': 'Unauthorized: You do not have permission to delete this task'}), 403
-
-    # Insert the deleted task into deleted_tasks with current timestamp.
-    deletion_time = datetime.now().isoformat()
-    with get_db_connection() as conn:
-        conn.execute('''
-            INSERT INTO deleted_tasks (user_id, title, description, start_date, due_date, completion_date, status, deletion_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (task['user_id'], task['title'], task['description'], task['start_date'], task['due_date'], task['completion_date'], task['status'], deletion_time))
-        conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-        conn.commit()
-    return jsonify({'message': 'Task deleted'}), 200
+@require_user
+def delete_task(auth_user_id, task_id):
+    conn = get_db_connection()
+    # Mark the task deleted with current timestamp, only if it belongs to the user.
+    cur = conn.execute(SQL_DELETE_TASK, (time.time_ns(), task_id, auth_user_id))
+    if cur.rowcount == 0:
+        return task_write_denied(conn, task_id, ERR_FORBIDDEN_DELETE)
+    conn.commit()
+    return json_response({'message': 'Task deleted'}, 200)
 
 # ---------------------------
 # Batch Delete & Restore Endpoints
 # ---------------------------
 @app.route('/tasks/batch_delete', methods=['DELETE'])
-def batch_delete_tasks():
-    auth_user_id = request.headers.get('X-User-Id')
-    if not auth_user_id:
-        return jsonify({'error': 'Authentication required via X-User-Id header'}), 401
-    try:
-        auth_user_id = int(auth_user_id)
-    except ValueError:
-        return jsonify({'error': 'Invalid X-User-Id header'}), 400
-    if not user_exists(auth_user_id):
-        return jsonify({'error': 'User does not exist'}), 401
+@require_user
+def batch_delete_tasks(auth_user_id):
+    data = get_validated_body(BATCH_DELETE_V)
+    if data is None:
+        return ERR_DATES_REQUIRED
+    start_date, end_date = data['start_date'], data['end_date']
 
-    data = request.get_json()
-    start_date = data.get('start_date')
-    end_date = data.get('end_date')
+    if not ISO_DATE_RE.fullmatch(start_date) or not ISO_DATE_RE.fullmatch(end_date):
+        return ERR_INVALID_DATE
 
-    if not start_date or not end_date:
-        return jsonify({'error': 'Both start_date and end_date are required'}), 400
+    if start_date.replace(' ', 'T', 1) > end_date.replace(' ', 'T', 1):
+        return ERR_DATE_ORDER
 
-    try:
-        start_date_obj = datetime.fromisoformat(start_date)
-        end_date_obj = datetime.fromisoformat(end_date)
-    except ValueError:
-        return jsonify({'error': 'Invalid date format. Use ISO 8601 format: YYYY-MM-DDTHH:MM:SS'}), 400
-
-    if start_date_obj > end_date_obj:
-        return jsonify({'error': 'start_date must be before end_date'}), 400
-
-    deletion_time = datetime.now().isoformat()
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        # Copy tasks to deleted_tasks table.
-        cursor.execute('''
-            INSERT INTO deleted_tasks (user_id, title, description, start_date, due_date, completion_date, status, deletion_time)
-            SELECT user_id, title, description, start_date, due_date, completion_date, status, ?
-            FROM tasks
-            WHERE user_id = ? AND due_date BETWEEN ? AND ?
-        ''', (deletion_time, auth_user_id, start_date, end_date))
-        # Delete the tasks.
-        cursor.execute('''
-            DELETE FROM tasks
-            WHERE user_id = ? AND due_date BETWEEN ? AND ?
-        ''', (auth_user_id, start_date, end_date))
-        conn.commit()
-        deleted_count = cursor.rowcount
+    conn = get_db_connection()
+    # Mark every task in the range deleted with the same timestamp.
+    cur = conn.execute(SQL_BATCH_DELETE_TASKS, (time.time_ns(), auth_user_id, start_date, end_date))
+    conn.commit()
+    deleted_count = cur.rowcount
 
-    return jsonify({'message': f'{deleted_count} tasks deleted successfully'}), 200
+    return json_response({'message': f'{deleted_count} tasks deleted successfully'}, 200)
 
 @app.route('/tasks/restore_last', methods=['POST'])
-def restore_last_deleted_task():
-    auth_user_id = request.headers.get('X-User-Id')
-    if not auth_user_id:
-        return jsonify({'error': 'Authentication required via X-User-Id header'}), 401
-    try:
-        auth_user_id = int(auth_user_id)
-    except ValueError:
-        return jsonify({'error': 'Invalid X-User-Id header'}), 400
-
-    with get_db_connection() as conn:
-        # Get the last deleted task for the authenticated user, based on deletion_time.
-        deleted_task = conn.execute('''
-            SELECT * FROM deleted_tasks 
-            WHERE user_id = ? 
-            ORDER BY datetime(deletion_time) DESC
-            LIMIT 1
-        ''', (auth_user_id,)).fetchone()
-
-        if not deleted_task:
-            return jsonify({'error': 'No deleted tasks found to restore'}), 404
-
-        # Reinsert the task into the tasks table.
-        cur = conn.execute('''
-            INSERT INTO tasks (user_id, title, description, start_date, due_date, completion_date, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            deleted_task['user_id'],
-            deleted_task['title'],
-            deleted_task['description'],
-            deleted_task['start_date'],
-            deleted_task['due_date'],
-            deleted_task['completion_date'],
-            deleted_task['status']
-        ))
-        conn.commit()
-        new_task_id = cur.lastrowid
-        # Remove the restored task from deleted_tasks.
-        conn.execute("DELETE FROM deleted_tasks WHERE id = ?", (deleted_task['id'],))
-        conn.commit()
+@require_user
+def restore_last_deleted_task(auth_user_id):
+    conn = get_db_connection()
+    # Clear the deletion mark of the last deleted task for the authenticated user.
+    restored = conn.execute(SQL_RESTORE_LAST_TASK, (auth_user_id,)).fetchone()
+
+    if not restored:
+        conn.rollback()
+        return ERR_NOTHING_TO_RESTORE
+
+    conn.commit()
+    new_task_id = restored['id']
 
-    return jsonify({'message': 'Task restored', 'new_task_id': new_task_id}), 200
+    return json_response({'message': 'Task restored', 'new_task_id': new_task_id}, 200)
 
 # ---------------------------
 # Subscription API Routes
 # ---------------------------
 @app.route('/subscribe', methods=['POST'])
 def subscribe():
-    data = request.get_json()
-    user_id = data.get('user_id')
-    frequency = data.get('frequency')
-    if not user_id or frequency not in ['daily', 'weekly', 'monthly']:
-        return jsonify({'error': 'Invalid subscription data; user_id and frequency (daily, weekly, monthly) required'}), 400
-
-    with get_db_connection() as conn:
-        conn.execute("INSERT INTO subscriptions (user_id, frequency) VALUES (?, ?)", (user_id, frequency))
-        conn.commit()
-    return jsonify({'message': 'Subscribed successfully'}), 201
+    data = get_validated_body(SUBSCRIBE_V, _SUBSCRIPTION_RULES)
+    if data is None:
+        return ERR_INVALID_SUBSCRIPTION
+
+    conn = get_db_connection()
+    conn.execute(SQL_INSERT_SUBSCRIPTION, (data['user_id'], data['frequency']))
+    conn.commit()
+    return json_response({'message': 'Subscribed successfully'}, 201)
 
 @app.route('/unsubscribe', methods=['POST'])
 def unsubscribe():
-    data = request.get_json()
-    user_id = data.get('user_id')
-    if not user_id:
-        return jsonify({'error': 'user_id is required'}), 400
+    data = get_validated_body(UNSUBSCRIBE_V, _SUBSCRIPTION_RULES)
+    if data is None:
+        return ERR_USER_ID_REQUIRED
 
-    with get_db_connection() as conn:
-        conn.execute("DELETE FROM subscriptions WHERE user_id = ?", (user_id,))
-        conn.commit()
-    return jsonify({'message': 'Unsubscribed successfully'}), 200
+    conn = get_db_connection()
+    conn.execute(SQL_DELETE_SUBSCRIPTIONS, (data['user_id'],))
+    conn.commit()
+    return json_response({'message': 'Unsubscribed successfully'}, 200)
 
 if __name__ == '__main__':
+    # Initialize the DB before starting the development server.
+    init_db()
     app.run(debug=True)
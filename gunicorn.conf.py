@@ -0,0 +1,13 @@
+# Gunicorn settings: one process per core, each serving requests on a pool of threads.
+# Every thread keeps its own SQLite connection, and WAL mode lets readers run in parallel.
+import multiprocessing
+
+bind = '0.0.0.0:5000'
+workers = multiprocessing.cpu_count()
+worker_class = 'gthread'
+threads = 8
+
+# Create the schema once in the master process, before any worker is forked.
+def on_starting(server):
+    from app import init_db
+    init_db()